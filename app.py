@@ -11,7 +11,7 @@ Features:
 - Export history as CSV
 
 Notes:
-- For demo/local use only. For production, use proper password hashing (bcrypt), email verification, HTTPS, and an external DB.
+- For demo/local use only. For production, add email verification, HTTPS, and an external DB.
 
 """
 
@@ -20,8 +20,12 @@ import sqlite3
 from datetime import datetime, date
 from zoneinfo import ZoneInfo
 import hashlib
+import hmac
+from functools import partial
 import pandas as pd
 import os
+import tempfile
+import threading
 
 # ----------------------------
 # Database helpers
@@ -29,15 +33,43 @@ import os
 DB_PATH = "tasks.db"
 
 
+@st.cache_resource
 def get_conn():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    """Return the process-wide SQLite connection (opened once, reused across reruns)."""
+    # writes go through `with _write_lock(), conn:` and take the SQLite write lock up front (BEGIN IMMEDIATE)
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level='IMMEDIATE')
     conn.row_factory = sqlite3.Row
     return conn
 
 
+@st.cache_resource
+def _write_lock():
+    """Process-wide lock for write transactions on the shared connection.
+
+    Transaction state belongs to the connection, not the thread, so two sessions
+    writing at once would start, commit or roll back each other's transactions.
+    """
+    return threading.Lock()
+
+
+@st.cache_resource
+def _task_writes():
+    """Per-user count of task writes, so a session's own caches can tell when that user's tasks changed elsewhere."""
+    return {}
+
+
+@st.cache_resource
 def init_db():
+    """Configure the connection and create tables/indexes; cached so it runs once per process."""
     conn = get_conn()
     cur = conn.cursor()
+    # WAL keeps readers in other processes (e.g. the sqlite3 CLI, backups) unblocked while the app writes;
+    # bigger page cache + mmap for history scans
+    cur.execute('PRAGMA journal_mode=WAL')
+    cur.execute('PRAGMA synchronous=NORMAL')
+    cur.execute('PRAGMA temp_store=MEMORY')
+    cur.execute('PRAGMA cache_size=-64000')
+    cur.execute('PRAGMA mmap_size=268435456')
     # users table
     cur.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -63,6 +95,17 @@ def init_db():
             FOREIGN KEY(user_id) REFERENCES users(id)
         )
     ''')
+    # indexes for the per-user day/history lookups and the pending bucket
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_tasks_user_date ON tasks(user_id, task_date)')
+    # partial index over pending rows only, in the bucket's display order so it needs no sort
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tasks_pending ON tasks(user_id, task_date, task_time) WHERE status = 'pending'")
+    # ANALYZE on empty tables records no stats, so keep running it until tasks has some;
+    # after that PRAGMA optimize re-analyzes only when the stats have gone stale
+    cur.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+    if cur.fetchone() is None or cur.execute("SELECT 1 FROM sqlite_stat1 WHERE tbl = 'tasks' LIMIT 1").fetchone() is None:
+        cur.execute('ANALYZE')
+    else:
+        cur.execute('PRAGMA optimize')
     conn.commit()
     return conn
 
@@ -70,52 +113,75 @@ def init_db():
 # Auth helpers
 # ----------------------------
 
-def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
+SALT_BYTES = 16
+
+
+def hash_password(password: str, salt: bytes | None = None) -> str:
+    """Hash with scrypt and return hex 'salt||hash' (a fresh random salt is used if none given)."""
+    if salt is None:
+        salt = os.urandom(SALT_BYTES)
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=16384, r=8, p=1, dklen=32)
+    return (salt + digest).hex()
+
+
+def verify_password(password: str, stored: str) -> bool:
+    if len(stored) == 64:
+        # legacy unsalted sha256 hash from before the switch to scrypt
+        candidate = hashlib.sha256(password.encode()).hexdigest()
+    else:
+        candidate = hash_password(password, bytes.fromhex(stored[:SALT_BYTES * 2]))
+    return hmac.compare_digest(candidate, stored)
 
 
 def register_user(username: str, password: str) -> (bool, str):
     conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute('INSERT INTO users (username, password_hash, created_at) VALUES (?, ?, ?)',
-                    (username, hash_password(password), now_ist()))
-        conn.commit()
+    # the UNIQUE constraint on username still guards duplicates; OR IGNORE just reports them as 0 rows
+    with _write_lock(), conn:
+        cur = conn.execute('INSERT OR IGNORE INTO users (username, password_hash, created_at) VALUES (?, ?, ?)',
+                           (username, hash_password(password), now_ist()))
+    if cur.rowcount == 1:
         return True, "Registered successfully"
-    except sqlite3.IntegrityError:
-        return False, "Username already taken"
+    return False, "Username already taken"
 
 
 def login_user(username: str, password: str) -> (bool, dict):
     conn = get_conn()
     cur = conn.cursor()
-    cur.execute('SELECT * FROM users WHERE username = ?', (username,))
+    cur.execute('SELECT id, password_hash FROM users WHERE username = ? LIMIT 1', (username,))
     row = cur.fetchone()
     if not row:
         return False, None
-    if row['password_hash'] != hash_password(password):
+    if not verify_password(password, row['password_hash']):
         return False, None
-    user = dict(row)
+    if len(row['password_hash']) == 64:
+        # upgrade legacy sha256 hashes on the first successful login
+        with _write_lock(), conn:
+            conn.execute('UPDATE users SET password_hash = ? WHERE id = ?', (hash_password(password), row['id']))
+    user = {'id': row['id'], 'username': username}
     return True, user
 
 # ----------------------------
 # Time helpers (IST)
 # ----------------------------
 
+IST = ZoneInfo('Asia/Kolkata')
+_TS_FMT = '%Y-%m-%d %H:%M:%S'  # stored timestamps
+_DISPLAY_FMT = '%d-%m-%Y %I:%M %p'  # shown in the UI
+
+
 def now_ist():
     """Return current time in IST as a string without milliseconds."""
-    ist = ZoneInfo('Asia/Kolkata')
-    return datetime.now(ist).strftime('%Y-%m-%d %H:%M:%S')
+    # isoformat avoids parsing a strftime pattern; drop tzinfo so no '+05:30' suffix is stored
+    return datetime.now(IST).replace(tzinfo=None).isoformat(sep=' ', timespec='seconds')
 
 
 def format_display(dt_str: str) -> str:
     """Format stored IST datetime string 'YYYY-MM-DD HH:MM:SS' to display like 'DD-MM-YYYY hh:mm AM/PM'."""
     try:
-        ist = ZoneInfo('Asia/Kolkata')
-        dt = datetime.strptime(dt_str, '%Y-%m-%d %H:%M:%S')
+        dt = datetime.strptime(dt_str, _TS_FMT)
         # attach IST tzinfo (stored values are in IST already)
-        dt = dt.replace(tzinfo=ist)
-        return dt.strftime('%d-%m-%Y %I:%M %p')
+        dt = dt.replace(tzinfo=IST)
+        return dt.strftime(_DISPLAY_FMT)
     except Exception:
         return dt_str
 
@@ -123,57 +189,134 @@ def format_display(dt_str: str) -> str:
 # Task helpers
 # ----------------------------
 
+# built once at import so the write path doesn't rebuild the statement text
+_ADD_TASK_SQL = ('INSERT INTO tasks (user_id, title, description, created_at, task_date, task_time, '
+                 'status, status_changed_at, pending_from) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)')
+_CHANGE_STATUS_SQL = ('UPDATE tasks SET status = ?, status_changed_at = ?, pending_from = ? WHERE id = ? '
+                      'RETURNING id, user_id, status, pending_from')
+
+
+def _invalidate_task_cache(user_id: int):
+    """Drop cached task reads after a write to the tasks table and bump the owner's write count."""
+    get_tasks_for_date.clear()
+    get_day_counts.clear()
+    get_pending_tasks.clear()
+    get_history.clear()
+    get_history_summary.clear()
+    has_history.clear()
+    writes = _task_writes()
+    writes[user_id] = writes.get(user_id, 0) + 1
+
+
 def add_task(user_id: int, title: str, description: str, task_date: str, task_time: str | None):
     conn = get_conn()
-    cur = conn.cursor()
     now = now_ist()
-    cur.execute('''INSERT INTO tasks (user_id, title, description, created_at, task_date, task_time, status, status_changed_at, pending_from)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (user_id, title, description, now, task_date, task_time or '', 'pending', now, now))
-    conn.commit()
+    with _write_lock(), conn:
+        conn.execute(_ADD_TASK_SQL, (user_id, title, description, now, task_date, task_time or '', 'pending', now, now))
+    _invalidate_task_cache(user_id)
 
 
-def get_tasks_for_date(user_id: int, task_date: str):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute('SELECT * FROM tasks WHERE user_id = ? AND task_date = ? ORDER BY id', (user_id, task_date))
-    return [dict(r) for r in cur.fetchall()]
+@st.cache_data(ttl=60, show_spinner=False)
+def get_tasks_for_date(user_id: int, task_date: str) -> pd.DataFrame:
+    # only the columns the Today editor shows
+    query = ("SELECT id, title, description, task_time, status, created_at FROM tasks "
+             "WHERE user_id = ? AND task_date = ? ORDER BY id")
+    return pd.read_sql_query(query, get_conn(), params=(user_id, task_date))
 
 
-def get_pending_tasks(user_id: int):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM tasks WHERE user_id = ? AND status = 'pending' ORDER BY task_date, task_time", (user_id,))
-    return [dict(r) for r in cur.fetchall()]
+@st.cache_data(ttl=60, show_spinner=False)
+def get_day_counts(user_id: int, task_date: str) -> tuple[int, int]:
+    """(done, pending) counts for one day, served by the same idx_tasks_user_date probe as the task list."""
+    cur = get_conn().execute(
+        "SELECT COALESCE(SUM(status = 'done'), 0), COALESCE(SUM(status = 'pending'), 0) "
+        "FROM tasks WHERE user_id = ? AND task_date = ?", (user_id, task_date))
+    done, pending = cur.fetchone()
+    return done, pending
+
 
+@st.cache_data(ttl=60, show_spinner=False)
+def get_pending_tasks(user_id: int) -> pd.DataFrame:
+    # only the columns the Pending Bucket table shows
+    query = ("SELECT id, title, task_date, task_time, pending_from, created_at, description FROM tasks "
+             "WHERE user_id = ? AND status = 'pending' ORDER BY task_date, task_time")
+    return pd.read_sql_query(query, get_conn(), params=(user_id,))
 
-def change_task_status(task_id: int, new_status: str):
+
+def change_task_status(task_id: int, new_status: str) -> sqlite3.Row | None:
+    """Update the task's status and return its new (id, user_id, status, pending_from), or None if no such task."""
     conn = get_conn()
-    cur = conn.cursor()
     now = now_ist()
     if new_status == 'pending':
         pending_from = now
     else:
         pending_from = None
-    cur.execute('UPDATE tasks SET status = ?, status_changed_at = ?, pending_from = ? WHERE id = ?',
-                (new_status, now, pending_from, task_id))
-    conn.commit()
+    with _write_lock(), conn:
+        row = conn.execute(_CHANGE_STATUS_SQL, (new_status, now, pending_from, task_id)).fetchone()
+    if row is not None:
+        _invalidate_task_cache(row['user_id'])
+    return row
+
+
+# one fixed statement (open ends bound as NULL) so SQLite reuses the same plan for every range
+_HISTORY_SQL = ("SELECT id, task_date, task_time, title, COALESCE(description, '') AS description, status, "
+                "created_at, status_changed_at FROM tasks WHERE user_id = ? "
+                "AND task_date BETWEEN COALESCE(?, '0000-01-01') AND COALESCE(?, '9999-12-31') "
+                "ORDER BY task_date DESC, task_time DESC")
+
+
+def _history_query(user_id: int, start_date: str | None, end_date: str | None):
+    return _HISTORY_SQL, (user_id, start_date or None, end_date or None)
+
 
+@st.cache_data(ttl=60, show_spinner=False)
+def get_history(user_id: int, start_date: str | None = None, end_date: str | None = None) -> pd.DataFrame:
+    """Return the user's tasks in the date range as a DataFrame, read straight from the cursor by pandas."""
+    query, params = _history_query(user_id, start_date, end_date)
+    return pd.read_sql_query(query, get_conn(), params=params)
 
-def get_history(user_id: int, start_date: str | None = None, end_date: str | None = None):
+
+@st.cache_data(ttl=60, show_spinner=False)
+def has_history(user_id: int, start_date: str | None, end_date: str | None) -> bool:
+    """Whether the range has any tasks; an index probe that stops at the first row."""
+    cur = get_conn().execute(
+        "SELECT 1 FROM tasks WHERE user_id = ? "
+        "AND task_date BETWEEN COALESCE(?, '0000-01-01') AND COALESCE(?, '9999-12-31') LIMIT 1",
+        (user_id, start_date or None, end_date or None))
+    return cur.fetchone() is not None
+
+
+EXPORT_CHUNK_ROWS = 10_000
+
+
+def export_history_csv(user_id: int, start_date: str | None, end_date: str | None,
+                       rows_per_chunk: int = EXPORT_CHUNK_ROWS) -> bytes:
+    """Write history as CSV chunk by chunk into a spooled temp file (spills to disk when large).
+
+    Returns the CSV bytes, or b'' when there are no rows in the range.
+    """
+    query, params = _history_query(user_id, start_date, end_date)
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024, mode='w+b') as tmp:
+        first_chunk = True
+        for chunk in pd.read_sql_query(query, get_conn(), params=params, chunksize=rows_per_chunk):
+            # an empty range still yields one empty chunk; don't let it write a header-only file
+            if chunk.empty:
+                continue
+            chunk.to_csv(tmp, header=first_chunk, index=False)
+            first_chunk = False
+        if first_chunk:
+            return b''
+        tmp.seek(0)
+        return tmp.read()
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_history_summary(user_id: int, start_date: str, end_date: str) -> pd.DataFrame:
+    """Per-day counts of total / done / pending tasks, aggregated in SQLite."""
     conn = get_conn()
-    cur = conn.cursor()
-    query = 'SELECT * FROM tasks WHERE user_id = ?'
-    params = [user_id]
-    if start_date:
-        query += ' AND task_date >= ?'
-        params.append(start_date)
-    if end_date:
-        query += ' AND task_date <= ?'
-        params.append(end_date)
-    query += ' ORDER BY task_date DESC, task_time'
-    cur.execute(query, params)
-    return [dict(r) for r in cur.fetchall()]
+    query = ("SELECT task_date, COUNT(*) AS total_tasks, SUM(status = 'done') AS done, "
+             "SUM(status = 'pending') AS pending FROM tasks "
+             "WHERE user_id = ? AND task_date BETWEEN ? AND ? GROUP BY task_date ORDER BY task_date")
+    return pd.read_sql_query(query, conn, params=(user_id, start_date, end_date))
 
 # ----------------------------
 # UI
@@ -182,9 +325,10 @@ def get_history(user_id: int, start_date: str | None = None, end_date: str | Non
 # Delete helpers
 def delete_task(task_id: int):
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
-    conn.commit()
+    with _write_lock(), conn:
+        row = conn.execute("DELETE FROM tasks WHERE id = ? RETURNING user_id", (task_id,)).fetchone()
+    if row is not None:
+        _invalidate_task_cache(row['user_id'])
 
 def _delete_task_callback(task_id):
     delete_task(task_id)
@@ -214,6 +358,60 @@ def _mark_pending_callback(task_id):
     change_task_status(task_id, 'pending')
     st.session_state['refresh'] = not st.session_state.get('refresh', False)
 
+# The Today editor writes from on_change, before the fragment reruns: the rerun then loads fresh
+# data, which gives the editor a new identity and clears the edits it just applied. Writing after
+# the editor returned instead would leave that reset to the *next* interaction and drop its edit.
+def _apply_today_edits(task_ids, was_done):
+    changes = st.session_state['today_editor']
+    deleted = set(changes.get('deleted_rows', []))
+    for pos in deleted:
+        delete_task(task_ids[pos])
+    for pos, edit in changes.get('edited_rows', {}).items():
+        pos = int(pos)
+        if pos in deleted or 'done' not in edit or edit['done'] == was_done[pos]:
+            continue
+        change_task_status(task_ids[pos], 'done' if edit['done'] else 'pending')
+    st.session_state['refresh'] = not st.session_state.get('refresh', False)
+
+# The pending bucket keeps its list in session_state and patches it from the UPDATE ... RETURNING
+# rows, so acting on a few tasks doesn't re-query the whole bucket. Writes to this user's tasks from
+# anywhere else bump their _task_writes() entry and make the next page load fetch a fresh list.
+def _load_pending(user_id):
+    writes = _task_writes().get(user_id, 0)
+    cached = st.session_state.get('pending_cache')
+    if cached is None or cached['user_id'] != user_id or cached['writes'] != writes:
+        tasks = get_pending_tasks(user_id)
+        if cached is None or cached['tasks']['id'].tolist() != tasks['id'].tolist():
+            _reset_pending_selection()
+        cached = {'user_id': user_id, 'writes': writes, 'tasks': tasks}
+        st.session_state['pending_cache'] = cached
+    return cached['tasks']
+
+def _reset_pending_selection():
+    # the table's selection is kept as row positions tied to its key, not to the data, so once the
+    # rows change it would point at other tasks; a new key starts the table with nothing selected
+    st.session_state['pending_table_gen'] = st.session_state.get('pending_table_gen', 0) + 1
+
+def _patch_pending_cache(removed_ids):
+    cached = st.session_state.get('pending_cache')
+    if cached is not None:
+        tasks = cached['tasks']
+        cached['tasks'] = tasks[~tasks['id'].isin(removed_ids)].reset_index(drop=True)
+        cached['writes'] = _task_writes().get(cached['user_id'], 0)
+    if removed_ids:
+        _reset_pending_selection()
+
+def _mark_selected_done_callback(task_ids):
+    rows = [change_task_status(task_id, 'done') for task_id in task_ids]
+    _patch_pending_cache([r['id'] for r in rows if r is not None and r['status'] != 'pending'])
+    st.session_state['refresh'] = not st.session_state.get('refresh', False)
+
+def _delete_selected_callback(task_ids):
+    for task_id in task_ids:
+        delete_task(task_id)
+    _patch_pending_cache(task_ids)
+    st.session_state['refresh'] = not st.session_state.get('refresh', False)
+
 # Sidebar: auth and navigation
 with st.sidebar:
     st.header("Account")
@@ -253,7 +451,42 @@ user_id = user['id']
 # Pages
 # ----------------------------
 
-if page == 'Add Task':
+@st.fragment
+def render_today(user_id: int):
+    """Tasks for one day in a single editor; ticking 'done' or deleting a row only reruns this fragment."""
+    st.header("Tasks for a Day")
+    chosen_date = st.date_input('Choose date', value=date.today())
+    tasks = get_tasks_for_date(user_id, chosen_date.isoformat())
+    if tasks.empty:
+        st.info('No tasks for this date')
+        return
+    # edits are written by the editor's on_change callback before this run, so the counts are current
+    done, pending = get_day_counts(user_id, chosen_date.isoformat())
+    st.write(f"**{done}** done / **{pending}** pending")
+    # Format created_at for display (IST) for all tasks in one pass
+    tasks['added'] = pd.to_datetime(tasks['created_at'], format=_TS_FMT).dt.strftime(_DISPLAY_FMT)
+    tasks['done'] = tasks['status'] == 'done'
+    view = tasks.set_index('id')[['done', 'title', 'description', 'task_time', 'added']]
+    st.data_editor(
+        view,
+        key='today_editor',
+        on_change=_apply_today_edits,
+        args=(view.index.tolist(), view['done'].tolist()),
+        hide_index=True,
+        num_rows='delete',
+        disabled=['title', 'description', 'task_time', 'added'],
+        column_config={
+            'done': st.column_config.CheckboxColumn('Done'),
+            'title': 'Title',
+            'description': 'Description',
+            'task_time': 'Time',
+            'added': 'Added',
+        },
+    )
+
+
+@st.fragment
+def render_add(user_id: int):
     st.header("Add Task")
     with st.form('add_task'):
         title = st.text_input('Task title')
@@ -270,166 +503,113 @@ if page == 'Add Task':
                 add_task(user_id, title.strip(), description.strip(), task_date.isoformat(), ttime)
                 st.success('Task added')
 
-elif page == 'Today':
-    st.header("Tasks for a Day")
-    chosen_date = st.date_input('Choose date', value=date.today())
-    tasks = get_tasks_for_date(user_id, chosen_date.isoformat())
-    if not tasks:
-        st.info('No tasks for this date')
-    else:
-        for t in tasks:
-            # Color coding
-            bg = '#d4edda' if t['status']=='done' else '#f8d7da'
-            st.markdown(f"""
-            <div style='background:{bg}; padding:10px; border-radius:10px; margin-bottom:10px;'>
-            <b>{t['title']}</b><br>
-            {t['description'] if t['description'] else ''}
-            </div>
-            """, unsafe_allow_html=True)
-            (f"**{t['title']}**  ")
-            if t['description']:
-                st.write(t['description'])
-            cols = st.columns([1,1,4])
-            with cols[0]:
-                st.write(f"Status: **{t['status']}**")
-            with cols[1]:
-                if t['status'] == 'pending':
-                    st.button(
-                        'Mark Done',
-                        key=f"done_{t['id']}",
-                        on_click=_mark_done_callback,
-                        args=(t['id'],)
-                    )
-                else:
-                    st.button(
-                        'Mark Pending',
-                        key=f"pending_{t['id']}",
-                        on_click=_mark_pending_callback,
-                        args=(t['id'],)
-                    )
-                    st.button(
-                        'Delete',
-                        key=f"delete_{t['id']}",
-                        on_click=_delete_task_callback,
-                        args=(t['id'],)
-                    )
-            with cols[2]:
-                # Format created_at for display (IST)
-                added_str = format_display(t['created_at'])
-                st.write(f"Added: {added_str}")
-                st.write(f"Time: {t['task_time']}")
-
-elif page == 'Pending Bucket':
+
+@st.fragment
+def render_pending(user_id: int):
     st.header('Pending Bucket')
-    pend = get_pending_tasks(user_id)
-    if not pend:
+    pend = _load_pending(user_id).copy()
+    if pend.empty:
         st.success('No pending tasks. Nice!')
     else:
-        for p in pend:
-            bg = '#d4edda' if p['status']=='done' else '#f8d7da'
-            ist = ZoneInfo('Asia/Kolkata')
-            pending_from = p['pending_from'] or p['created_at']
-            try:
-                dt = datetime.strptime(pending_from, '%Y-%m-%d %H:%M:%S')
-                dt = dt.replace(tzinfo=ist)
-                delta = datetime.now(ist) - dt
-                days = delta.days
-                hours = delta.seconds // 3600
-                mins = (delta.seconds % 3600) // 60
-                since = f"{days}d {hours}h {mins}m ago"
-            except Exception:
-                since = pending_from
-
-            # Card HTML
-            st.markdown(f"""
-            <div style='background:{bg}; padding:12px; border-radius:10px; margin-bottom:12px; box-shadow: 0 1px 3px rgba(0,0,0,0.08);'>
-              <div style='display:flex; justify-content:space-between; align-items:center;'>
-                <div>
-                  <strong style='font-size:16px;'>{p['title']}</strong><br>
-                  <small>{p['task_date']} {p['task_time']}</small>
-                </div>
-                <div style='text-align:right;'>
-                  <small>Pending since:<br>{format_display(pending_from)}</small>
-                </div>
-              </div>
-              <div style='margin-top:8px;'>
-                {p['description'] if p['description'] else ''}
-              </div>
-            </div>
-            """, unsafe_allow_html=True)
-
-            cols = st.columns([1,1,6])
-            with cols[0]:
-                st.button('Mark Done', key=f"pend_done_{p['id']}", on_click=_mark_done_callback, args=(p['id'],))
-            with cols[1]:
-                st.button('Delete', key=f"pend_delete_{p['id']}", on_click=_delete_task_callback, args=(p['id'],))
-            with cols[2]:
-                st.write('')
-
-elif page == 'History':
+        # durations for all rows at once; stored times are naive IST
+        pending_from = pd.to_datetime(pend['pending_from'].fillna(pend['created_at']), format=_TS_FMT)
+        delta = pd.Timestamp.now(tz=IST).tz_localize(None) - pending_from
+        secs = delta.dt.seconds
+        pend['pending_since'] = pending_from.dt.strftime(_DISPLAY_FMT)
+        pend['since'] = (delta.dt.days.astype(str) + 'd ' + (secs // 3600).astype(str) + 'h '
+                         + ((secs % 3600) // 60).astype(str) + 'm ago')
+
+        # one table widget instead of a card + buttons per task; actions apply to the selected rows
+        event = st.dataframe(
+            pend[['title', 'task_date', 'task_time', 'description', 'pending_since', 'since']],
+            hide_index=True,
+            on_select='rerun',
+            selection_mode='multi-row',
+            key=f"pending_table_{st.session_state.get('pending_table_gen', 0)}",
+        )
+        selected = pend['id'].iloc[event.selection.rows].tolist()
+        cols = st.columns([1,1,6])
+        with cols[0]:
+            st.button('Mark Done', key='pend_done', disabled=not selected,
+                      on_click=_mark_selected_done_callback, args=(selected,))
+        with cols[1]:
+            st.button('Delete', key='pend_delete', disabled=not selected,
+                      on_click=_delete_selected_callback, args=(selected,))
+        with cols[2]:
+            st.caption('Select rows to mark done or delete')
+
+
+@st.fragment
+def render_history(user_id: int):
     st.header('History')
+    today = date.today()
     col1, col2 = st.columns(2)
     with col1:
-        sdate = st.date_input('Start date', value=date.today().replace(day=1))
+        sdate = st.date_input('Start date', value=today.replace(day=1))
     with col2:
-        edate = st.date_input('End date', value=date.today())
+        edate = st.date_input('End date', value=today)
     hist = get_history(user_id, sdate.isoformat(), edate.isoformat())
-    if not hist:
+    if hist.empty:
         st.info('No history in this range')
     else:
-        # Show day-wise grouped cards
-        grouped = {}
-        for r in hist:
-            grouped.setdefault(r['task_date'], []).append(r)
-        for day in sorted(grouped.keys(), reverse=True):
+        # Show day-wise grouped cards (query already returns newest day first)
+        for day, day_rows in hist.groupby('task_date', sort=False):
             st.subheader(day)
-            for r in grouped[day]:
-                bg = '#d4edda' if r['status']=='done' else '#f8d7da'
+            for r in day_rows.itertuples(index=False):
+                bg = '#d4edda' if r.status=='done' else '#f8d7da'
                 st.markdown(f"""
                 <div style='background:{bg}; padding:12px; border-radius:10px; margin-bottom:10px; box-shadow: 0 1px 3px rgba(0,0,0,0.08);'>
                   <div style='display:flex; justify-content:space-between; align-items:center;'>
                     <div>
-                      <strong style='font-size:15px;'>{r['title']}</strong><br>
-                      <small>{r['description'] if r['description'] else ''}</small>
+                      <strong style='font-size:15px;'>{r.title}</strong><br>
+                      <small>{r.description if r.description else ''}</small>
                     </div>
                     <div style='text-align:right;'>
-                      <small>Added: {format_display(r['created_at'])}<br>Status changed: {format_display(r['status_changed_at'])}</small>
+                      <small>Added: {format_display(r.created_at)}<br>Status changed: {format_display(r.status_changed_at)}</small>
                     </div>
                   </div>
                 </div>
                 """, unsafe_allow_html=True)
                 cols = st.columns([1,1,6])
                 with cols[0]:
-                    if r['status']=='pending':
-                        st.button('Mark Done', key=f"hist_done_{r['id']}", on_click=_mark_done_callback, args=(r['id'],))
+                    if r.status=='pending':
+                        st.button('Mark Done', key=f"hist_done_{r.id}", on_click=_mark_done_callback, args=(r.id,))
                     else:
-                        st.button('Mark Pending', key=f"hist_pending_{r['id']}", on_click=_mark_pending_callback, args=(r['id'],))
+                        st.button('Mark Pending', key=f"hist_pending_{r.id}", on_click=_mark_pending_callback, args=(r.id,))
                 with cols[1]:
-                    st.button('Delete', key=f"hist_delete_{r['id']}", on_click=_delete_task_callback, args=(r['id'],))
+                    st.button('Delete', key=f"hist_delete_{r.id}", on_click=_delete_task_callback, args=(r.id,))
                 with cols[2]:
                     st.write('')
 
         # day-wise summary
         if st.button('Show day-wise summary'):
-            df = pd.DataFrame(hist)
-            summary = df.groupby('task_date').agg(
-                total_tasks=('title','count'),
-                done=('status', lambda s: (s=='done').sum()),
-                pending=('status', lambda s: (s=='pending').sum())
-            ).reset_index()
+            summary = get_history_summary(user_id, sdate.isoformat(), edate.isoformat())
             st.dataframe(summary)
 
-elif page == 'Export CSV':
+
+@st.fragment
+def render_export(user_id: int):
     st.header('Export History as CSV')
-    sdate = st.date_input('Start date', value=date.today().replace(day=1))
-    edate = st.date_input('End date', value=date.today())
-    hist = get_history(user_id, sdate.isoformat(), edate.isoformat())
-    if not hist:
+    today = date.today()
+    sdate = st.date_input('Start date', value=today.replace(day=1))
+    edate = st.date_input('End date', value=today)
+    if not has_history(user_id, sdate.isoformat(), edate.isoformat()):
         st.info('No data to export')
     else:
-        df = pd.DataFrame(hist)
-        csv = df.to_csv(index=False)
-        st.download_button('Download CSV', csv, file_name=f'history_{sdate}_{edate}.csv')
+        # passed as a callable so the CSV is only built when the user actually clicks Download
+        st.download_button('Download CSV', partial(export_history_csv, user_id, sdate.isoformat(), edate.isoformat()),
+                           file_name=f'history_{sdate}_{edate}.csv', mime='text/csv')
+
+
+# each page is a fragment, so its widgets rerun only that page; sidebar/auth stay as rendered
+PAGES = {
+    'Add Task': render_add,
+    'Today': render_today,
+    'Pending Bucket': render_pending,
+    'History': render_history,
+    'Export CSV': render_export,
+}
+PAGES[page](user_id)
 
 # Footer
 st.write('---')